@@ -53,9 +53,10 @@ if [ -f ".env" ]; then
 fi
 
 # 2e. Restart app (example with gunicorn)
+# Single worker: the scheduler lives in-process, so scale with threads, not workers
 echo "Restarting app..."
 pkill -f "gunicorn" || true
-gunicorn -w 1 -k gthread --threads=4 -b 0.0.0.0:8080 wsgi:app
+gunicorn -w 1 -k gthread --threads=16 -b 0.0.0.0:8080 wsgi:app
 
 echo "Deployment complete!"
 EOF
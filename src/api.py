@@ -1,5 +1,6 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, render_template
 import logging
+import orjson
 import uuid
 from src.models import Message
 from src.scheduler import SMSScheduler
@@ -7,6 +8,19 @@ from src.scheduler import SMSScheduler
 logger = logging.getLogger(__name__)
 
 
+def _json(obj, status: int = 200) -> Response:
+    """JSON response encoded with orjson (faster than jsonify's stdlib json)"""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+
+def _check_serializable(message: Message):
+    """Reject messages the state serializer can't encode (e.g. ints beyond 64 bits)"""
+    try:
+        orjson.dumps(message.to_dict())
+    except TypeError as e:
+        raise ValueError(f"Message is not serializable: {e}")
+
+
 class SchedulerAPI:
     """Web API and UI for SMS Scheduler"""
 
@@ -31,20 +45,20 @@ class SchedulerAPI:
             """Start the scheduler"""
             try:
                 self.scheduler.start()
-                return jsonify({'status': 'success', 'message': 'Scheduler started'})
+                return _json({'status': 'success', 'message': 'Scheduler started'})
             except Exception as e:
                 logger.error(f"Failed to start scheduler: {e}")
-                return jsonify({'status': 'error', 'message': str(e)}), 500
+                return _json({'status': 'error', 'message': str(e)}, 500)
 
         @self.app.route('/api/stop', methods=['POST'])
         def stop():
             """Stop the scheduler"""
             try:
                 self.scheduler.stop()
-                return jsonify({'status': 'success', 'message': 'Scheduler stopped'})
+                return _json({'status': 'success', 'message': 'Scheduler stopped'})
             except Exception as e:
                 logger.error(f"Failed to stop scheduler: {e}")
-                return jsonify({'status': 'error', 'message': str(e)}), 500
+                return _json({'status': 'error', 'message': str(e)}, 500)
 
         @self.app.route('/api/send', methods=['POST'])
         def send_single():
@@ -56,65 +70,86 @@ class SchedulerAPI:
                     content=data['content'],
                     metadata=data.get('metadata')
                 )
+                _check_serializable(message)
                 self.scheduler.newMessage(message)
-                return jsonify({
+                return _json({
                     'status': 'success',
                     'message_id': message.message_id
                 })
             except Exception as e:
                 logger.error(f"Failed to send message: {e}")
-                return jsonify({'status': 'error', 'message': str(e)}), 400
+                return _json({'status': 'error', 'message': str(e)}, 400)
 
         @self.app.route('/api/send-bulk', methods=['POST'])
         def send_bulk():
-            """Send N copies of the same message"""
+            """Send N copies of the same message, or a list of messages"""
             try:
                 data = request.json
-                count = data.get('count', 1)
-                message_ids = []
-
-                for i in range(count):
-                    message = Message(
-                        message_id=str(uuid.uuid4()),
-                        content=data['content'],
-                        metadata={'bulk_index': i, **(data.get('metadata', {}))}
-                    )
-                    self.scheduler.newMessage(message)
-                    message_ids.append(message.message_id)
-
-                return jsonify({
+
+                # One uuid4 per request; a counter suffix keeps ids unique within it
+                base_id = uuid.uuid4().hex
+
+                if 'messages' in data:
+                    messages = [
+                        Message(
+                            message_id=f"{base_id}-{i}",
+                            content=item['content'],
+                            metadata=item.get('metadata')
+                        )
+                        for i, item in enumerate(data['messages'])
+                    ]
+                    for message in messages:
+                        _check_serializable(message)
+                else:
+                    count = data.get('count', 1)
+                    metadata = data.get('metadata', {})
+                    messages = [
+                        Message(
+                            message_id=f"{base_id}-{i}",
+                            content=data['content'],
+                            metadata={'bulk_index': i, **metadata}
+                        )
+                        for i in range(count)
+                    ]
+                    # Copies differ only by bulk_index, so checking one covers all
+                    if messages:
+                        _check_serializable(messages[0])
+
+                self.scheduler.newMessages(messages)
+
+                return _json({
                     'status': 'success',
-                    'count': count,
-                    'message_ids': message_ids
+                    'count': len(messages),
+                    'message_ids': [message.message_id for message in messages]
                 })
             except Exception as e:
                 logger.error(f"Failed to send bulk messages: {e}")
-                return jsonify({'status': 'error', 'message': str(e)}), 400
+                return _json({'status': 'error', 'message': str(e)}, 400)
 
         @self.app.route('/api/stats', methods=['GET'])
         def get_stats():
             """Get scheduler statistics"""
-            return jsonify(self.scheduler.get_stats())
+            return _json(self.scheduler.get_stats())
 
         @self.app.route('/api/success', methods=['GET'])
         def get_success():
             """Get recent successful messages"""
             limit = request.args.get('limit', 100, type=int)
             messages = self.scheduler.get_recent_success(limit)
-            return jsonify({'count': len(messages), 'messages': messages})
+            return _json({'count': len(messages), 'messages': messages})
 
         @self.app.route('/api/failed', methods=['GET'])
         def get_failed():
             """Get recent failed messages"""
             limit = request.args.get('limit', 100, type=int)
             messages = self.scheduler.get_recent_failed(limit)
-            return jsonify({'count': len(messages), 'messages': messages})
+            return _json({'count': len(messages), 'messages': messages})
 
         @self.app.route('/api/config', methods=['GET', 'POST'])
         def manage_config():
             """Get or update S3 configuration"""
             if request.method == 'GET':
-                return jsonify({
+                return _json({
                     's3_bucket': self.config.S3_BUCKET,
                     's3_state_prefix': self.config.S3_STATE_PREFIX,
                     's3_success_prefix': self.config.S3_SUCCESS_PREFIX,
@@ -123,7 +158,7 @@ class SchedulerAPI:
             else:
                 # Update config (Note: requires restart to take effect)
                 data = request.json
-                return jsonify({
+                return _json({
                     'status': 'success',
                     'message': 'Config update requires restart'
                 })
@@ -131,7 +166,7 @@ class SchedulerAPI:
         @self.app.route('/health', methods=['GET'])
         def health():
             """Health check endpoint"""
-            return jsonify({
+            return _json({
                 'status': 'healthy',
                 'scheduler_running': self.scheduler.running
             })
@@ -20,6 +20,25 @@ class Config:
     S3_SUCCESS_PREFIX: str = os.getenv('S3_SUCCESS_PREFIX', 'success')
     S3_FAILED_PREFIX: str = os.getenv('S3_FAILED_PREFIX', 'failed')
 
+    # Batched / concurrent S3 access
+    S3_WRITE_BATCH_SIZE: int = int(os.getenv('S3_WRITE_BATCH_SIZE', '100'))
+    S3_WRITE_MAX_WAIT_MS: int = int(os.getenv('S3_WRITE_MAX_WAIT_MS', '200'))
+    S3_WRITE_CONCURRENCY: int = int(os.getenv('S3_WRITE_CONCURRENCY', '32'))
+    S3_READ_CONCURRENCY: int = int(os.getenv('S3_READ_CONCURRENCY', '64'))
+    # Codec for snapshot / WAL objects: 'none' or 'zstd'
+    S3_STATE_COMPRESSION: str = os.getenv('S3_STATE_COMPRESSION', 'zstd')
+    # Seconds between snapshots that compact the WAL
+    SNAPSHOT_INTERVAL_S: float = float(os.getenv('SNAPSHOT_INTERVAL_S', '60'))
+
+    # Seconds to cache /api/success and /api/failed listings
+    RECENT_CACHE_TTL: float = float(os.getenv('RECENT_CACHE_TTL', '2'))
+
+    # Independent scheduler shards (heap + lock + wakeup thread each)
+    SCHEDULER_SHARDS: int = int(os.getenv('SCHEDULER_SHARDS', '4'))
+
+    # Concurrent calls to the send function
+    SEND_CONCURRENCY: int = int(os.getenv('SEND_CONCURRENCY', '16'))
+
     # API Configuration
     API_HOST: str = os.getenv('API_HOST', '0.0.0.0')
     API_PORT: int = int(os.getenv('API_PORT', '8080'))
@@ -30,10 +30,11 @@ def send(message: Message) -> bool:
     return success
 
 
-def main():
-    """Main application entry point"""
-    logger.info("Starting SMS Retry Scheduler...")
-
+def create_app() -> SchedulerAPI:
+    """
+    Build the scheduler and API and start the scheduler threads.
+    Shared by main() (dev server) and wsgi.py (gunicorn).
+    """
     # Load configuration
     config = Config.from_env()
 
@@ -46,8 +47,17 @@ def main():
     # Start scheduler
     scheduler.start()
 
-    logger.info(f"API server starting on {config.API_HOST}:{config.API_PORT}")
-    logger.info(f"Web UI available at http://localhost:{config.API_PORT}")
+    return api
+
+
+def main():
+    """Local development entry point (Flask dev server); production runs wsgi:app under gunicorn"""
+    logger.info("Starting SMS Retry Scheduler...")
+
+    api = create_app()
+
+    logger.info(f"API server starting on {api.config.API_HOST}:{api.config.API_PORT}")
+    logger.info(f"Web UI available at http://localhost:{api.config.API_PORT}")
 
     # Run API server (blocking)
     api.run()
@@ -1,8 +1,12 @@
 import boto3
-import json
+import orjson
+import zstandard
 import logging
 import os
-from typing import List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Set, Tuple
 from datetime import datetime
 from botocore.exceptions import ClientError
 from src.models import MessageState, MessageStatus
@@ -14,7 +18,22 @@ logger = logging.getLogger(__name__)
 
 
 class S3PersistenceLayer:
-    """Handles all S3 operations for message state persistence"""
+    """
+    Handles all S3 operations for message state persistence.
+
+    Pending states live under the state prefix as a periodic snapshot
+    (snapshot-{generation}) plus an append-only WAL of state updates
+    (wal-{generation}-{sequence}); recovery is one snapshot GET plus a replay
+    of the WAL batches written since. Completed messages are also logged
+    one object each under the success/failed prefixes.
+    """
+
+    # S3 DeleteObjects accepts at most 1000 keys per request
+    MAX_DELETE_KEYS = 1000
+
+    # Key suffix marking zstd-compressed objects
+    ZSTD_SUFFIX = '.zst'
+    ZSTD_LEVEL = 3
 
     def __init__(self, config: Config):
         self.config = config
@@ -36,6 +55,18 @@ class S3PersistenceLayer:
         self.state_prefix = config.S3_STATE_PREFIX
         self.success_prefix = config.S3_SUCCESS_PREFIX
         self.failed_prefix = config.S3_FAILED_PREFIX
+        self.compress_state = config.S3_STATE_COMPRESSION == 'zstd'
+
+        # Highest snapshot/WAL generation found in S3 during recovery
+        self.last_generation = 0
+
+        # Pools for concurrent puts/deletes when flushing a batch and for fan-out GETs
+        self.executor = ThreadPoolExecutor(max_workers=config.S3_WRITE_CONCURRENCY)
+        self.read_executor = ThreadPoolExecutor(max_workers=config.S3_READ_CONCURRENCY)
+
+        # TTL cache for recent success/failed listings: (prefix, limit) -> (expires_at, results)
+        self._recent_cache: Dict[Tuple[str, int], Tuple[float, List[dict]]] = {}
+        self._recent_cache_lock = threading.Lock()
 
         # Ensure bucket exists (for LocalStack)
         self._ensure_bucket_exists()
@@ -59,113 +90,231 @@ class S3PersistenceLayer:
             else:
                 logger.error(f"Error checking bucket: {e}")
 
-    def save_message_state(self, state: MessageState):
-        """Persist message state to S3"""
-        try:
-            key = f"{self.state_prefix}/{state.message_id}.json"
-            self.s3_client.put_object(
-                Bucket=self.bucket,
-                Key=key,
-                Body=state.to_json(),
-                ContentType='application/json'
-            )
-            logger.debug(f"Saved state for message {state.message_id}")
-        except Exception as e:
-            logger.error(f"Failed to save state for {state.message_id}: {e}")
-            raise
+    def _log_suffix(self) -> str:
+        """Suffix for snapshot and WAL objects under the configured codec"""
+        return '.jsonl' + self.ZSTD_SUFFIX if self.compress_state else '.jsonl'
 
-    def load_message_state(self, message_id: str) -> Optional[MessageState]:
-        """Load message state from S3"""
-        try:
-            key = f"{self.state_prefix}/{message_id}.json"
-            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
-            json_str = response['Body'].read().decode('utf-8')
-            return MessageState.from_json(json_str)
-        except self.s3_client.exceptions.NoSuchKey:
-            return None
-        except Exception as e:
-            logger.error(f"Failed to load state for {message_id}: {e}")
-            return None
+    def _snapshot_key(self, generation: int) -> str:
+        """Key of the snapshot starting a generation"""
+        return f"{self.state_prefix}/snapshot-{generation:013d}{self._log_suffix()}"
 
-    def load_all_pending_states(self) -> List[MessageState]:
-        """Load all pending message states from S3 (for recovery)"""
-        states = []
-        try:
-            paginator = self.s3_client.get_paginator('list_objects_v2')
-            pages = paginator.paginate(Bucket=self.bucket, Prefix=self.state_prefix)
+    def _wal_key(self, generation: int, sequence: int) -> str:
+        """Key of one WAL batch; zero padding makes keys sort in replay order"""
+        return f"{self.state_prefix}/wal-{generation:013d}-{sequence:010d}{self._log_suffix()}"
 
-            for page in pages:
-                if 'Contents' not in page:
-                    continue
+    def _parse_state_key(self, key: str) -> Tuple[str, int]:
+        """
+        Classify a key under the state prefix.
+        Returns ('snapshot' | 'wal', generation) or ('legacy', 0) for the
+        per-message {messageId}.json objects written by earlier versions.
+        """
+        name = key[len(self.state_prefix) + 1:].split('.', 1)[0]
+        kind, _, rest = name.partition('-')
+        if kind in ('snapshot', 'wal') and rest[:13].isdigit():
+            return kind, int(rest[:13])
+        return 'legacy', 0
 
-                for obj in page['Contents']:
-                    try:
-                        response = self.s3_client.get_object(
-                            Bucket=self.bucket,
-                            Key=obj['Key']
-                        )
-                        json_str = response['Body'].read().decode('utf-8')
-                        state = MessageState.from_json(json_str)
-
-                        if state.status == MessageStatus.PENDING:
-                            states.append(state)
-                    except Exception as e:
-                        logger.error(f"Failed to load state from {obj['Key']}: {e}")
-                        continue
-
-            logger.info(f"Loaded {len(states)} pending messages from S3")
-            return states
-        except Exception as e:
-            logger.error(f"Failed to load pending states: {e}")
-            return []
-
-    def mark_success(self, message_id: str, state: MessageState):
-        """Mark message as successfully sent"""
-        try:
-            # Write to success log
-            timestamp = datetime.utcnow().isoformat()
-            key = f"{self.success_prefix}/{timestamp}_{message_id}.json"
+    def _put_object(self, key: str, body: bytes):
+        """Write a JSON body, zstd-compressing it when the key ends in .zst"""
+        if key.endswith(self.ZSTD_SUFFIX):
             self.s3_client.put_object(
                 Bucket=self.bucket,
                 Key=key,
-                Body=state.to_json(),
-                ContentType='application/json'
+                Body=zstandard.compress(body, self.ZSTD_LEVEL),
+                ContentType='application/json',
+                ContentEncoding='zstd',
+                Metadata={'codec': 'zstd'}
             )
-
-            # Delete from state
-            self._delete_state(message_id)
-            logger.info(f"Marked message {message_id} as SUCCESS")
-        except Exception as e:
-            logger.error(f"Failed to mark success for {message_id}: {e}")
-            raise
-
-    def mark_failed(self, message_id: str, state: MessageState):
-        """Mark message as failed after max retries"""
-        try:
-            # Write to failed log
-            timestamp = datetime.utcnow().isoformat()
-            key = f"{self.failed_prefix}/{timestamp}_{message_id}.json"
+        else:
             self.s3_client.put_object(
                 Bucket=self.bucket,
                 Key=key,
-                Body=state.to_json(),
+                Body=body,
                 ContentType='application/json'
             )
 
-            # Delete from state
-            self._delete_state(message_id)
-            logger.info(f"Marked message {message_id} as FAILED_MAX_RETRIES")
+    def _list_state_keys(self) -> List[str]:
+        """List every object under the state prefix"""
+        keys = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(Bucket=self.bucket, Prefix=f"{self.state_prefix}/")
+
+        for page in pages:
+            if 'Contents' not in page:
+                continue
+            keys.extend(obj['Key'] for obj in page['Contents'])
+        return keys
+
+    def load_all_pending_states(self) -> List[MessageState]:
+        """
+        Load all pending message states from S3 (for recovery).
+
+        Loads the latest snapshot (one GET) and replays the WAL batches of
+        that generation and later, in order. Without a snapshot, per-message
+        state objects from earlier versions are loaded as the base instead.
+        The highest generation seen is kept in `last_generation`.
+
+        Any listing, read or decode error is raised rather than returning a
+        partial set: the first snapshot after recovery deletes the objects it
+        supersedes, so running on incomplete state would destroy the rest.
+        """
+        # Listing is cheap; classify every key first, then fetch concurrently
+        snapshots, wals, legacy = [], [], []
+        for key in self._list_state_keys():
+            kind, generation = self._parse_state_key(key)
+            self.last_generation = max(self.last_generation, generation)
+            if kind == 'snapshot':
+                snapshots.append((generation, key))
+            elif kind == 'wal':
+                wals.append((generation, key))
+            else:
+                legacy.append(key)
+
+        states: Dict[str, MessageState] = {}
+        base_generation = 0
+        if snapshots:
+            base_generation, snapshot_key = max(snapshots)
+            for state in self._read_states(snapshot_key):
+                states[state.message_id] = state
+        else:
+            futures = {self.read_executor.submit(self._load_one, key): key for key in legacy}
+            for future in as_completed(futures):
+                state = future.result()
+                states[state.message_id] = state
+
+        # Replay newer WAL batches in key order; each line is a full state,
+        # completed ones drop the message
+        replay = sorted(key for generation, key in wals if generation >= base_generation)
+        for batch in self.read_executor.map(self._read_states, replay):
+            for state in batch:
+                if state.status == MessageStatus.PENDING:
+                    states[state.message_id] = state
+                else:
+                    states.pop(state.message_id, None)
+
+        pending = [state for state in states.values() if state.status == MessageStatus.PENDING]
+        logger.info(
+            f"Loaded {len(pending)} pending messages from S3 "
+            f"({len(snapshots)} snapshots, {len(replay)} WAL batches replayed)")
+        return pending
+
+    def _read_states(self, key: str) -> List[MessageState]:
+        """Fetch and decode a state object (one state per line), logging the key on failure"""
+        try:
+            return [MessageState.from_json(line) for line in self._get_body(key).splitlines()]
         except Exception as e:
-            logger.error(f"Failed to mark failed for {message_id}: {e}")
+            logger.error(f"Failed to load states from {key}: {e}")
             raise
 
-    def _delete_state(self, message_id: str):
-        """Delete message state from S3"""
+    def _load_one(self, key: str) -> MessageState:
+        """Fetch and decode a single (legacy, possibly pretty-printed) state object"""
         try:
-            key = f"{self.state_prefix}/{message_id}.json"
-            self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+            return MessageState.from_json(self._get_body(key))
         except Exception as e:
-            logger.error(f"Failed to delete state for {message_id}: {e}")
+            logger.error(f"Failed to load state from {key}: {e}")
+            raise
+
+    def _get_body(self, key: str) -> bytes:
+        """Fetch an object body, decompressing .zst objects"""
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        body = response['Body'].read()
+        if key.endswith(self.ZSTD_SUFFIX):
+            return zstandard.decompress(body)
+        return body
+
+    def _put_log(self, prefix: str, message_id: str, body: bytes):
+        """Write a final state to the success/failed log prefix"""
+        timestamp = datetime.utcnow().isoformat()
+        key = f"{prefix}/{timestamp}_{message_id}.json"
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=body,
+            ContentType='application/json'
+        )
+
+    def write_completed(self, updates: Dict[str, Tuple[MessageStatus, bytes]]) -> Dict[str, Tuple[MessageStatus, bytes]]:
+        """
+        Write SUCCESS / FAILED_MAX_RETRIES states (message_id -> (status,
+        serialized state)) to their log prefix concurrently.
+        Returns the updates whose log write failed.
+        """
+        futures = {
+            self.executor.submit(self._put_completed, message_id, status, body): message_id
+            for message_id, (status, body) in updates.items()
+        }
+        failed = {}
+        for future in as_completed(futures):
+            message_id = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to log completed message {message_id}: {e}")
+                failed[message_id] = updates[message_id]
+        return failed
+
+    def append_wal(self, generation: int, sequence: int,
+                   updates: Dict[str, Tuple[MessageStatus, bytes]], unlogged: Set[str]):
+        """
+        Append a batch of coalesced state updates (message_id -> (status,
+        serialized state)) to the WAL as one object, one state per line.
+
+        Completed messages in `unlogged` have no success/failed log object yet;
+        they are written as PENDING so recovery retries them instead of losing
+        them. Raises if the put fails.
+        """
+        lines = [
+            self.as_pending(body) if message_id in unlogged else body
+            for message_id, (status, body) in updates.items()
+        ]
+        self._put_object(self._wal_key(generation, sequence), b"\n".join(lines))
+        logger.debug(f"Flushed {len(updates)} state updates to S3")
+
+    @staticmethod
+    def as_pending(body: bytes) -> bytes:
+        """Re-serialize a state with its status reset to PENDING"""
+        state = MessageState.from_json(body)
+        state.status = MessageStatus.PENDING
+        return state.to_json()
+
+    def _put_completed(self, message_id: str, status: MessageStatus, body: bytes):
+        """Log a completed message under the success or failed prefix"""
+        if status == MessageStatus.SUCCESS:
+            self._put_log(self.success_prefix, message_id, body)
+            logger.info(f"Marked message {message_id} as SUCCESS")
+        else:
+            self._put_log(self.failed_prefix, message_id, body)
+            logger.info(f"Marked message {message_id} as FAILED_MAX_RETRIES")
+
+    def save_snapshot(self, generation: int, bodies: List[bytes]):
+        """
+        Write every pending state as one snapshot object (one state per line),
+        then delete the snapshots, WAL batches and legacy state objects it supersedes.
+        Only called once recovery has loaded every existing object (start() fails otherwise).
+        """
+        self._put_object(self._snapshot_key(generation), b"\n".join(bodies))
+        logger.info(f"Saved snapshot {generation} with {len(bodies)} pending messages")
+
+        obsolete = []
+        for key in self._list_state_keys():
+            _, key_generation = self._parse_state_key(key)
+            if key_generation < generation:
+                obsolete.append(key)
+        self._delete_keys(obsolete)
+
+    def _delete_keys(self, keys: List[str]):
+        """Delete many objects, up to MAX_DELETE_KEYS per request"""
+        for i in range(0, len(keys), self.MAX_DELETE_KEYS):
+            chunk = keys[i:i + self.MAX_DELETE_KEYS]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': key} for key in chunk], 'Quiet': True}
+                )
+                for error in response.get('Errors', []):
+                    logger.error(f"Failed to delete {error['Key']}: {error.get('Message')}")
+            except Exception as e:
+                logger.error(f"Failed to delete {len(chunk)} objects: {e}")
 
     def get_recent_success(self, limit: int = 100) -> List[dict]:
         """Get last N successful messages"""
@@ -176,7 +325,27 @@ class S3PersistenceLayer:
         return self._get_recent_from_prefix(self.failed_prefix, limit)
 
     def _get_recent_from_prefix(self, prefix: str, limit: int) -> List[dict]:
-        """Helper to get recent messages from a prefix"""
+        """
+        Helper to get recent messages from a prefix.
+        Results are cached for RECENT_CACHE_TTL seconds so a polling UI
+        doesn't re-list and re-fetch the prefix on every request.
+        """
+        key = (prefix, limit)
+        now = time.time()
+        with self._recent_cache_lock:
+            cached = self._recent_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        results = self._load_recent_from_prefix(prefix, limit)
+        with self._recent_cache_lock:
+            # Drop expired entries so arbitrary ?limit= values can't grow the cache
+            self._recent_cache = {k: v for k, v in self._recent_cache.items() if v[0] > now}
+            self._recent_cache[key] = (now + self.config.RECENT_CACHE_TTL, results)
+        return results
+
+    def _load_recent_from_prefix(self, prefix: str, limit: int) -> List[dict]:
+        """List a prefix and fetch its newest objects"""
         try:
             response = self.s3_client.list_objects_v2(
                 Bucket=self.bucket,
@@ -194,15 +363,12 @@ class S3PersistenceLayer:
                 reverse=True
             )[:limit]
 
+            # Fetch concurrently, keeping the newest-first order
+            futures = [self.read_executor.submit(self._get_body, obj['Key']) for obj in objects]
             results = []
-            for obj in objects:
+            for obj, future in zip(objects, futures):
                 try:
-                    response = self.s3_client.get_object(
-                        Bucket=self.bucket,
-                        Key=obj['Key']
-                    )
-                    json_str = response['Body'].read().decode('utf-8')
-                    results.append(json.loads(json_str))
+                    results.append(orjson.loads(future.result()))
                 except Exception as e:
                     logger.error(f"Failed to load {obj['Key']}: {e}")
                     continue
@@ -2,7 +2,10 @@ import threading
 import time
 import logging
 import heapq
-from typing import Dict, List, Callable
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Callable, Tuple
 from src.models import Message, MessageState, MessageStatus
 from src.persistence import S3PersistenceLayer
 from src.config import Config
@@ -10,20 +13,28 @@ from src.config import Config
 logger = logging.getLogger(__name__)
 
 
-class SMSScheduler:
+@dataclass
+class _WalRotation:
+    """Write-queue marker: updates queued after it belong to WAL `generation`"""
+    generation: int
+
+
+# Stands in for a write-queue item when the wait times out because a retry is due
+_RETRY_DUE = object()
+
+
+class _Shard:
     """
-    Thread-safe SMS retry scheduler with S3 persistence.
+    One partition of the scheduler's in-memory state.
 
-    Architecture:
-    - Priority queue (min-heap) for efficient time-based scheduling
-    - ReentrantLock for thread safety between newMessage() and wakeup()
-    - Bounded work per wakeup() tick (only process due messages)
+    Each shard owns its heap, message map, lock and wakeup thread, so
+    ingestion and retry draining on different shards never contend.
+    Sending and persistence are delegated back to the owning SMSScheduler.
     """
 
-    def __init__(self, config: Config, send_function: Callable[[Message], bool]):
-        self.config = config
-        self.send_function = send_function
-        self.persistence = S3PersistenceLayer(config)
+    def __init__(self, index: int, scheduler: 'SMSScheduler'):
+        self.index = index
+        self.scheduler = scheduler
 
         # Priority queue: (next_retry_at, message_id)
         self.retry_heap: List[tuple] = []
@@ -32,109 +43,90 @@ class SMSScheduler:
         self.message_map: Dict[str, MessageState] = {}
 
         # Thread synchronization
-        self.lock = threading.RLock()
+        self.lock = threading.Lock()
+        # Signalled when a sooner deadline reaches the heap top (or on stop)
+        self.cond = threading.Condition(self.lock)
 
         # Control flags
         self.running = False
         self.wakeup_thread = None
 
-        # Statistics
-        self.stats = {
-            'total_messages': 0,
-            'total_success': 0,
-            'total_failed': 0,
-            'in_progress': 0
-        }
-
-        logger.info("SMS Scheduler initialized")
+        # Statistics: plain ints, written only under self.lock and read
+        # without it (an attribute read is atomic, so readers never block writers)
+        self.total_messages = 0
+        self.total_success = 0
+        self.total_failed = 0
+        self.in_progress = 0
 
     def start(self):
-        """Start the scheduler and wakeup timer"""
+        """Start this shard's wakeup thread"""
         with self.lock:
-            if self.running:
-                logger.warning("Scheduler already running")
-                return
-
-            # Recover state from S3
-            self._recover_from_s3()
-
             self.running = True
-            self.wakeup_thread = threading.Thread(target=self._wakeup_loop, daemon=True)
-            self.wakeup_thread.start()
-            logger.info("Scheduler started")
+        self.wakeup_thread = threading.Thread(
+            target=self._wakeup_loop, name=f"wakeup-{self.index}", daemon=True)
+        self.wakeup_thread.start()
 
-    def stop(self):
-        """Stop the scheduler"""
-        with self.lock:
+    def signal_stop(self):
+        """Stop the wakeup loop without waiting for it"""
+        with self.cond:
             self.running = False
-            if self.wakeup_thread:
-                self.wakeup_thread.join(timeout=2)
-            logger.info("Scheduler stopped")
+            self.cond.notify_all()
 
-    def _recover_from_s3(self):
-        """Recover pending messages from S3 on startup"""
-        logger.info("Recovering state from S3...")
-        pending_states = self.persistence.load_all_pending_states()
-
-        current_time = time.time()
-        for state in pending_states:
-            # Adjust the next retry time if it's in the past
-            if state.next_retry_at < current_time:
-                state.next_retry_at = current_time
-
-            self.message_map[state.message_id] = state
-            heapq.heappush(self.retry_heap, (state.next_retry_at, state.message_id))
-
-        self.stats['in_progress'] = len(pending_states)
-        logger.info(f"Recovered {len(pending_states)} pending messages")
-
-    def newMessage(self, message: Message):
-        """
-        Handle new message arrival (called by external system).
-        Thread-safe, can be called concurrently with wakeup().
-        """
+    def recover(self, pending_states: List[MessageState], current_time: float) -> int:
+        """Track states recovered from S3, returns how many were added"""
         with self.lock:
-            current_time = time.time()
-
-            # Create initial state
-            state = MessageState(
-                message_id=message.message_id,
-                message=message,
-                attempt_count=0,
-                next_retry_at=current_time,  # Immediate first attempt
-                status=MessageStatus.PENDING,
-                created_at=current_time,
-                updated_at=current_time
-            )
+            recovered = 0
+            for state in pending_states:
+                # Already tracked (restart after stop()): its heap entry is live,
+                # a second one would only become a stale duplicate
+                if state.message_id in self.message_map:
+                    continue
 
-            self.message_map[message.message_id] = state
-            self.stats['total_messages'] += 1
-            self.stats['in_progress'] += 1
+                # Adjust the next retry time if it's in the past
+                if state.next_retry_at < current_time:
+                    state.next_retry_at = current_time
 
-            logger.info(f"New message received: {message.message_id}")
+                self.message_map[state.message_id] = state
+                heapq.heappush(self.retry_heap, (state.next_retry_at, state.message_id))
+                recovered += 1
 
-            # Attempt immediate send (attempt 0)
-            success = self._attempt_send(state)
+            self.in_progress += recovered
+            return recovered
 
-            if success:
-                self._handle_success(state)
-            else:
-                # Schedule first retry (0.5s from now)
-                self._schedule_next_retry(state)
+    def add_messages(self, messages: List[Message], current_time: float) -> List[MessageState]:
+        """Create and track initial states for new messages"""
+        with self.lock:
+            states = []
+            for message in messages:
+                state = MessageState(
+                    message_id=message.message_id,
+                    message=message,
+                    attempt_count=0,
+                    next_retry_at=current_time,  # Immediate first attempt
+                    status=MessageStatus.PENDING,
+                    created_at=current_time,
+                    updated_at=current_time
+                )
+                self.message_map[message.message_id] = state
+                states.append(state)
+
+            self.total_messages += len(states)
+            self.in_progress += len(states)
+            return states
 
     def wakeup(self):
         """
-        Process messages due for retry (called every 500ms).
-        Thread-safe, bounded work per tick.
+        Process messages due for retry (called when the heap top comes due).
+        Thread-safe, bounded work per call.
         """
         with self.lock:
             if not self.running:
                 return
 
             current_time = time.time()
-            processed_count = 0
+            due = []
 
-            # Process all messages due now (bounded by heap top)
+            # Collect all messages due now (bounded by heap top)
             while self.retry_heap:
                 next_time, message_id = self.retry_heap[0]
 
@@ -145,7 +137,9 @@ class SMSScheduler:
                 # Pop from heap
                 heapq.heappop(self.retry_heap)
 
-                # Check if the message still exists (might have been completed)
+                # Each pending message has exactly one heap entry, popped here
+                # before it is sent and completed, so completed messages never
+                # leave tombstones behind. Keep the check as a safeguard.
                 if message_id not in self.message_map:
                     continue
 
@@ -155,74 +149,73 @@ class SMSScheduler:
                 if state.status != MessageStatus.PENDING:
                     continue
 
-                # Attempt send
-                success = self._attempt_send(state)
+                due.append(state)
 
-                if success:
-                    self._handle_success(state)
-                else:
-                    # Check if max attempts reached
-                    if state.attempt_count >= MessageState.MAX_ATTEMPTS:
-                        self._handle_failure(state)
-                    else:
-                        self._schedule_next_retry(state)
-
-                processed_count += 1
-
-            if processed_count > 0:
-                logger.debug(f"Wakeup processed {processed_count} messages")
+        # Popped states are owned by this call until rescheduled, so sending
+        # can happen without the lock
+        if due:
+            self.scheduler._send_batch(due)
+            logger.debug(f"Shard {self.index} wakeup processed {len(due)} messages")
 
     def _wakeup_loop(self):
-        """Background thread that calls wakeup() every 500ms"""
-        logger.info("Wakeup loop started")
+        """
+        Background thread that calls wakeup() when the earliest retry is due.
+        Sleeps until the heap top's deadline, or indefinitely while the heap is
+        empty; new sooner deadlines and stop() interrupt the wait.
+        """
+        logger.info(f"Wakeup loop {self.index} started")
         while self.running:
             try:
+                with self.cond:
+                    if self.retry_heap:
+                        delay = self.retry_heap[0][0] - time.time()
+                    else:
+                        delay = None
+                    if self.running and (delay is None or delay > 0):
+                        self.cond.wait(timeout=delay)
+
                 self.wakeup()
-                time.sleep(0.5)  # 500ms tick
             except Exception as e:
-                logger.error(f"Error in wakeup loop: {e}", exc_info=True)
-        logger.info("Wakeup loop stopped")
-
-    def _attempt_send(self, state: MessageState) -> bool:
-        """
-        Attempt to send message using provided send function.
-        Returns True if successful, False otherwise.
-        """
-        try:
-            logger.info(
-                f"Attempting send for {state.message_id} (attempt {state.attempt_count + 1}/{MessageState.MAX_ATTEMPTS})")
+                logger.error(f"Error in wakeup loop {self.index}: {e}", exc_info=True)
+        logger.info(f"Wakeup loop {self.index} stopped")
 
-            success = self.send_function(state.message)
-
-            state.attempt_count += 1
-            state.updated_at = time.time()
+    def apply_results(self, results: List[Tuple[MessageState, bool]]):
+        """Record send attempts and complete or reschedule each message"""
+        with self.lock:
+            current_time = time.time()
+            for state, success in results:
+                state.attempt_count += 1
+                state.updated_at = current_time
 
-            return success
-        except Exception as e:
-            logger.error(f"Error sending message {state.message_id}: {e}")
-            state.attempt_count += 1
-            state.updated_at = time.time()
-            return False
+                if success:
+                    self._handle_success(state)
+                else:
+                    # Check if max attempts reached
+                    if state.attempt_count >= MessageState.MAX_ATTEMPTS:
+                        self._handle_failure(state)
+                    else:
+                        self._schedule_next_retry(state)
 
     def _schedule_next_retry(self, state: MessageState):
         """Schedule next retry attempt"""
-        if state.attempt_count >= len(MessageState.RETRY_SCHEDULE):
+        if state.attempt_count >= MessageState.MAX_ATTEMPTS:
             logger.error(f"No more retries for {state.message_id}")
             return
 
         delay = MessageState.RETRY_SCHEDULE[state.attempt_count]
-        state.next_retry_at = state.created_at + delay
+        next_retry_at = state.created_at + delay
+        state.next_retry_at = next_retry_at
 
-        # Add to heap
-        heapq.heappush(self.retry_heap, (state.next_retry_at, state.message_id))
+        # Add to heap, waking the loop if this is now the earliest deadline
+        entry = (next_retry_at, state.message_id)
+        heapq.heappush(self.retry_heap, entry)
+        if self.retry_heap[0] is entry:
+            self.cond.notify()
 
-        # Persist to S3
-        try:
-            self.persistence.save_message_state(state)
-        except Exception as e:
-            logger.error(f"Failed to persist state for {state.message_id}: {e}")
+        # Persist to S3 (batched by the background writer)
+        self.scheduler._enqueue_write(state)
 
-        logger.debug(f"Scheduled retry for {state.message_id} at {state.next_retry_at} (delay: {delay}s)")
+        logger.debug(f"Scheduled retry for {state.message_id} at {next_retry_at} (delay: {delay}s)")
 
     def _handle_success(self, state: MessageState):
         """Handle successful message delivery"""
@@ -233,14 +226,11 @@ class SMSScheduler:
         del self.message_map[state.message_id]
 
         # Update stats
-        self.stats['total_success'] += 1
-        self.stats['in_progress'] -= 1
+        self.total_success += 1
+        self.in_progress -= 1
 
-        # Persist to S3
-        try:
-            self.persistence.mark_success(state.message_id, state)
-        except Exception as e:
-            logger.error(f"Failed to persist success for {state.message_id}: {e}")
+        # Persist to S3 (batched by the background writer)
+        self.scheduler._enqueue_write(state)
 
         logger.info(f"✓ Message {state.message_id} sent successfully after {state.attempt_count} attempts")
 
@@ -253,21 +243,402 @@ class SMSScheduler:
         del self.message_map[state.message_id]
 
         # Update stats
-        self.stats['total_failed'] += 1
-        self.stats['in_progress'] -= 1
+        self.total_failed += 1
+        self.in_progress -= 1
+
+        # Persist to S3 (batched by the background writer)
+        self.scheduler._enqueue_write(state)
+
+        logger.warning(f"✗ Message {state.message_id} failed after {MessageState.MAX_ATTEMPTS} attempts")
+
+    def serialize_states(self) -> List[bytes]:
+        """Serialize every tracked state (for snapshots), skipping any that can't be encoded"""
+        bodies = []
+        with self.lock:
+            for state in self.message_map.values():
+                try:
+                    bodies.append(state.to_json())
+                except Exception as e:
+                    logger.error(f"Failed to serialize state for {state.message_id}: {e}")
+        return bodies
+
+
+class SMSScheduler:
+    """
+    Thread-safe SMS retry scheduler with S3 persistence.
+
+    Architecture:
+    - Messages are sharded by message_id hash across SCHEDULER_SHARDS
+      independent schedulers, each with its own heap, lock and wakeup thread
+    - Priority queue (min-heap) per shard for efficient time-based scheduling
+    - Non-reentrant Lock per shard for thread safety between newMessage() and
+      wakeup(); no S3 I/O happens while it is held
+    - Condition variable wakes a shard exactly when its earliest retry is due
+    - Bounded work per wakeup() call (only process due messages)
+    - Background writer coalesces state updates into batched WAL appends
+    - Snapshot thread periodically compacts the WAL into one snapshot object
+    """
+
+    # Backoff bounds (seconds) for retrying failed WAL appends and success/failed log writes
+    WRITE_RETRY_MIN_S = 0.5
+    WRITE_RETRY_MAX_S = 30.0
+
+    def __init__(self, config: Config, send_function: Callable[[Message], bool]):
+        self.config = config
+        self.send_function = send_function
+        # send_function is thread-safe; due batches are sent concurrently
+        self._send_pool = ThreadPoolExecutor(max_workers=config.SEND_CONCURRENCY)
+        self.persistence = S3PersistenceLayer(config)
+
+        # Independent schedulers, picked by hash(message_id)
+        self.shards = [_Shard(i, self) for i in range(config.SCHEDULER_SHARDS)]
+
+        # Serializes start()/stop() so recovery I/O runs outside the shard locks
+        self._lifecycle_lock = threading.Lock()
+
+        # Control flags
+        self.running = False
+
+        # Background S3 writer: queue of (message_id, status, serialized state)
+        # updates and _WalRotation markers
+        self._write_queue: queue.Queue = queue.Queue()
+        self._writer_thread = None
+        # Completed messages whose success/failed log write failed: message_id ->
+        # (status, serialized state). Owned by the writer; snapshots keep them as PENDING
+        self._unlogged: Dict[str, Tuple[MessageStatus, bytes]] = {}
+        self._unlogged_lock = threading.Lock()
+
+        # Snapshot thread; generations only ever increase
+        self._snapshot_thread = None
+        self._snapshot_stop = threading.Event()
+        self._last_generation = 0
+        # Set when state changed since the last snapshot
+        self._wal_dirty = False
+
+        logger.info(f"SMS Scheduler initialized with {len(self.shards)} shards")
+
+    def _shard_index(self, message_id: str) -> int:
+        """Index of the shard responsible for a message"""
+        return hash(message_id) % len(self.shards)
+
+    def start(self):
+        """Start the scheduler and wakeup timer"""
+        with self._lifecycle_lock:
+            if self.running:
+                logger.warning("Scheduler already running")
+                return
+
+            # Recover state from S3; on failure stay stopped rather than run
+            # (and snapshot) without the state that couldn't be read
+            try:
+                self._recover_from_s3()
+            except Exception as e:
+                logger.error(f"Recovery from S3 failed, scheduler not started: {e}")
+                raise
 
-        # Persist to S3
+            self.running = True
+            for shard in self.shards:
+                shard.start()
+            self._writer_thread = threading.Thread(
+                target=self._s3_writer_loop, args=(self._next_generation(),), daemon=True)
+            self._writer_thread.start()
+            self._snapshot_stop.clear()
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, daemon=True)
+            self._snapshot_thread.start()
+            logger.info("Scheduler started")
+
+    def stop(self):
+        """Stop the scheduler"""
+        with self._lifecycle_lock:
+            self.running = False
+            for shard in self.shards:
+                shard.signal_stop()
+            for shard in self.shards:
+                if shard.wakeup_thread:
+                    shard.wakeup_thread.join(timeout=2)
+
+            # Let an in-progress snapshot finish before the writer stops
+            self._snapshot_stop.set()
+            if self._snapshot_thread:
+                self._snapshot_thread.join()
+                self._snapshot_thread = None
+
+            # Flush outstanding writes; the writer exits on the None sentinel
+            if self._writer_thread:
+                self._write_queue.put(None)
+                self._writer_thread.join()
+                self._writer_thread = None
+            logger.info("Scheduler stopped")
+
+    def _recover_from_s3(self):
+        """Recover pending messages from S3 on startup"""
+        logger.info("Recovering state from S3...")
+        pending_states = self.persistence.load_all_pending_states()
+        # New generations must sort after everything already in S3
+        self._last_generation = max(self._last_generation, self.persistence.last_generation)
+
+        by_shard: Dict[int, List[MessageState]] = {}
+        for state in pending_states:
+            by_shard.setdefault(self._shard_index(state.message_id), []).append(state)
+
+        current_time = time.time()
+        recovered = sum(
+            self.shards[index].recover(states, current_time)
+            for index, states in by_shard.items()
+        )
+        logger.info(f"Recovered {recovered} pending messages")
+
+    def newMessage(self, message: Message):
+        """
+        Handle new message arrival (called by external system).
+        Thread-safe, can be called concurrently with wakeup().
+        """
+        self.newMessages([message])
+
+    def newMessages(self, messages: List[Message]):
+        """
+        Handle a batch of new messages (bulk ingestion).
+        Takes each shard's lock once for its part of the batch; the resulting
+        state updates reach S3 through the batched writer.
+        """
+        current_time = time.time()
+
+        by_shard: Dict[int, List[Message]] = {}
+        for message in messages:
+            by_shard.setdefault(self._shard_index(message.message_id), []).append(message)
+
+        # Create initial states
+        states = []
+        for index, shard_messages in by_shard.items():
+            states.extend(self.shards[index].add_messages(shard_messages, current_time))
+
+        for state in states:
+            logger.info(f"New message received: {state.message_id}")
+
+        # Attempt immediate send (attempt 0); failures schedule the first retry
+        self._send_batch(states)
+
+    def wakeup(self):
+        """
+        Process messages due for retry on every shard.
+        Normally driven by each shard's own wakeup thread.
+        """
+        for shard in self.shards:
+            shard.wakeup()
+
+    def _send_batch(self, states: List[MessageState]):
+        """
+        Send the states concurrently outside any lock, then hand the results
+        to the owning shards to complete or reschedule every message.
+        """
+        if len(states) == 1:
+            results = [self._attempt_send(states[0])]
+        else:
+            results = list(self._send_pool.map(self._attempt_send, states))
+
+        by_shard: Dict[int, List[Tuple[MessageState, bool]]] = {}
+        for state, success in zip(states, results):
+            by_shard.setdefault(self._shard_index(state.message_id), []).append((state, success))
+
+        for index, shard_results in by_shard.items():
+            self.shards[index].apply_results(shard_results)
+
+    def _s3_writer_loop(self, generation: int):
+        """
+        Background thread that drains the write queue into batched WAL appends.
+        A batch is flushed once it holds S3_WRITE_BATCH_SIZE messages,
+        S3_WRITE_MAX_WAIT_MS has passed since its first update, or a
+        _WalRotation marker starts a new generation.
+
+        Completed messages are logged to success/failed before their WAL line
+        is written. Nothing is dropped on S3 errors: a failed WAL append keeps
+        its batch (and sequence number) for the next attempt, and a failed log
+        write keeps the message in _unlogged; both are retried with
+        exponential backoff.
+        """
+        logger.info("S3 writer started")
+        batch_size = self.config.S3_WRITE_BATCH_SIZE
+        max_wait = self.config.S3_WRITE_MAX_WAIT_MS / 1000
+        sequence = 0
+        # Updates not yet appended to the WAL
+        held: Dict[str, Tuple[MessageStatus, bytes]] = {}
+        wal_backoff = log_backoff = 0.0
+        wal_retry_at = log_retry_at = 0.0
+
+        while True:
+            timeout = None
+            if held or self._unlogged:
+                retry_at = min(wal_retry_at if held else float('inf'),
+                               log_retry_at if self._unlogged else float('inf'))
+                timeout = max(0.0, retry_at - time.time())
+            try:
+                item = self._write_queue.get(timeout=timeout)
+            except queue.Empty:
+                item = _RETRY_DUE
+
+            # Dirty set: repeated updates to a message coalesce to the latest state
+            pending = {}
+            deadline = time.time() + max_wait
+            while isinstance(item, tuple):
+                message_id, status, body = item
+                pending[message_id] = (status, body)
+
+                remaining = deadline - time.time()
+                if len(pending) >= batch_size or remaining <= 0:
+                    break
+                try:
+                    item = self._write_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            held.update(pending)
+
+            # On stop, make one last attempt regardless of backoff
+            stopping = item is None
+            now = time.time()
+
+            to_log = {
+                message_id: update for message_id, update in pending.items()
+                if update[0] != MessageStatus.PENDING
+            }
+            if self._unlogged and (stopping or now >= log_retry_at):
+                with self._unlogged_lock:
+                    retries = dict(self._unlogged)
+                to_log.update(retries)
+            else:
+                retries = {}
+            if to_log:
+                failed = self.persistence.write_completed(to_log)
+                with self._unlogged_lock:
+                    for message_id, update in to_log.items():
+                        if message_id in failed:
+                            self._unlogged[message_id] = update
+                        else:
+                            self._unlogged.pop(message_id, None)
+                # A retried log write that succeeded still needs its terminal WAL line
+                held.update((m, u) for m, u in retries.items() if m not in failed)
+                if failed:
+                    log_backoff = self._next_backoff(log_backoff)
+                    log_retry_at = now + log_backoff
+                    # Snapshots carry these as PENDING until their log write succeeds
+                    self._wal_dirty = True
+                elif retries:
+                    log_backoff = 0.0
+
+            if held and (stopping or now >= wal_retry_at):
+                with self._unlogged_lock:
+                    unlogged = set(self._unlogged)
+                try:
+                    self.persistence.append_wal(generation, sequence, held, unlogged)
+                except Exception as e:
+                    wal_backoff = self._next_backoff(wal_backoff)
+                    wal_retry_at = now + wal_backoff
+                    logger.error(
+                        f"Failed to append WAL batch {generation}-{sequence} "
+                        f"({len(held)} updates), retrying in {wal_backoff:.1f}s: {e}")
+                else:
+                    held = {}
+                    sequence += 1
+                    wal_backoff = 0.0
+
+            if isinstance(item, _WalRotation):
+                # Held updates predate the marker; they are appended to the new generation
+                generation, sequence = item.generation, 0
+            elif stopping:
+                break
+
+        if held:
+            logger.error(f"S3 writer stopped with {len(held)} updates not appended to the WAL")
+        # Whatever is still unlogged is PENDING in S3 and is retried after recovery
+        with self._unlogged_lock:
+            self._unlogged.clear()
+        logger.info("S3 writer stopped")
+
+    def _next_backoff(self, backoff: float) -> float:
+        """Exponential backoff between WRITE_RETRY_MIN_S and WRITE_RETRY_MAX_S"""
+        return min(max(backoff * 2, self.WRITE_RETRY_MIN_S), self.WRITE_RETRY_MAX_S)
+
+    def _enqueue_write(self, state: MessageState):
+        """Queue a snapshot of the state for the background S3 writer"""
         try:
-            self.persistence.mark_failed(state.message_id, state)
+            body = state.to_json()
         except Exception as e:
-            logger.error(f"Failed to persist failure for {state.message_id}: {e}")
+            logger.error(f"Failed to serialize state for {state.message_id}: {e}")
+            return
+        self._write_queue.put((state.message_id, state.status, body))
+        self._wal_dirty = True
 
-        logger.warning(f"✗ Message {state.message_id} failed after {MessageState.MAX_ATTEMPTS} attempts")
+    def _next_generation(self) -> int:
+        """Next snapshot/WAL generation: epoch millis, strictly increasing"""
+        self._last_generation = max(self._last_generation + 1, int(time.time() * 1000))
+        return self._last_generation
+
+    def _snapshot_loop(self):
+        """
+        Background thread that snapshots all pending states on start and then
+        every SNAPSHOT_INTERVAL_S while anything has changed.
+        """
+        logger.info("Snapshot loop started")
+        self._wal_dirty = True
+        while True:
+            if self._wal_dirty:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    logger.error(f"Error in snapshot loop: {e}", exc_info=True)
+            if self._snapshot_stop.wait(self.config.SNAPSHOT_INTERVAL_S):
+                break
+        logger.info("Snapshot loop stopped")
+
+    def snapshot(self):
+        """
+        Write every pending state to a single snapshot object and drop the
+        WAL it replaces.
+
+        The rotation marker is queued before the shards are read: anything
+        queued earlier is already applied in memory and captured here, and
+        anything later lands in the new WAL generation, which recovery
+        replays on top of this snapshot.
+        """
+        self._wal_dirty = False
+        generation = self._next_generation()
+        self._write_queue.put(_WalRotation(generation))
+
+        bodies = []
+        for shard in self.shards:
+            bodies.extend(shard.serialize_states())
+        # Completed but not yet logged: keep them pending so recovery retries them
+        with self._unlogged_lock:
+            unlogged = [body for _, body in self._unlogged.values()]
+        bodies.extend(self.persistence.as_pending(body) for body in unlogged)
+        self.persistence.save_snapshot(generation, bodies)
+
+    def _attempt_send(self, state: MessageState) -> bool:
+        """
+        Attempt to send message using provided send function.
+        Called without any lock; the attempt is recorded by _Shard.apply_results().
+        Returns True if successful, False otherwise.
+        """
+        try:
+            logger.info(
+                f"Attempting send for {state.message_id} (attempt {state.attempt_count + 1}/{MessageState.MAX_ATTEMPTS})")
+
+            return self.send_function(state.message)
+        except Exception as e:
+            logger.error(f"Error sending message {state.message_id}: {e}")
+            return False
 
     def get_stats(self) -> dict:
-        """Get current statistics"""
-        with self.lock:
-            return self.stats.copy()
+        """
+        Get current statistics, summed across shards.
+        Lock-free: counters are read without taking the shard locks, so a
+        polling UI never contends with ingestion or wakeup.
+        """
+        return {
+            'total_messages': sum(shard.total_messages for shard in self.shards),
+            'total_success': sum(shard.total_success for shard in self.shards),
+            'total_failed': sum(shard.total_failed for shard in self.shards),
+            'in_progress': sum(shard.in_progress for shard in self.shards)
+        }
 
     def get_recent_success(self, limit: int = 100) -> List[dict]:
         """Get recent successful messages"""
@@ -1,15 +1,10 @@
-from src.api import SchedulerAPI
-from src.config import Config
-from src.scheduler import SMSScheduler
-from src.main import send
+from src.main import create_app
 
-# Build the full application exactly like main(), but WITHOUT calling app.run()
-config = Config.from_env()
-scheduler = SMSScheduler(config, send)
-api = SchedulerAPI(scheduler, config)
-
-# Start scheduler thread
-scheduler.start()
+# Build the full application exactly like main(), but WITHOUT calling app.run().
+# The scheduler threads start here, in the worker process: run a single worker
+# (scale with --threads) and don't use --preload, or the threads would be
+# started in the master and lost on fork.
+api = create_app()
 
 # Gunicorn needs 'app'
 app = api.app